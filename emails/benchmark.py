@@ -0,0 +1,167 @@
+"""
+Load benchmark for the email pipeline.
+
+Drives BaseEmail.send against synthetic sheets served by the local stand-in in tool.fake_google_api
+and reports the throughput and the latency of the API calls made by GoogleApiWrapper. Nothing is
+sent to the live Google APIs.
+
+    python benchmark.py --rows 100 1000 5000 20000 --latency 0.005 --script-error-rate 0.01
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+from datetime import datetime
+from typing import List
+
+import httplib2
+
+from tool.base_email import BaseEmail
+from tool.fake_google_api import FakeGoogleApi
+from tool.google_api_wrapper import GoogleApiWrapper
+from tool.metrics import Metrics, percentile
+from tool.spreadsheet import Spreadsheet
+
+SPREADSHEET_ID = 'benchmark'
+SHEET_NAME = 'Sheet1'
+HEADERS = ['First Name', 'Last Name', 'Email', 'Status', 'Assigned Interviewer', 'Sent At']
+INTERVIEWERS = {
+    'Jiahao': {'calendly': 'https://calendly.com/jiahao', 'email': 'jiahao@example.com'},
+    'Mayank': {'calendly': 'https://calendly.com/mayank', 'email': 'mayank@example.com'},
+}
+
+class TimedHttp(httplib2.Http):
+    """
+    Transport that records the wall time of every request made through it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+
+    def request(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+class BenchmarkEmail(BaseEmail):
+    def get_email(self, row: Spreadsheet.Row):
+        return row.values['Email']
+
+    def filter_fn(self, row: Spreadsheet.Row):
+        return row.values['Status'] == 'Pending'
+
+    def on_send(self, rows: List[Spreadsheet.Row]):
+        sent_at = datetime.now().isoformat(timespec='seconds')
+        data = self.prepare_update_data('Status', rows, 'Invite Sent', {'Sent At': sent_at})
+        self.wrapper.update_spreadsheet_values(self.spreadsheet_id, data)
+
+    def render_content(self, row: Spreadsheet.Row):
+        interviewer = INTERVIEWERS[row.values['Assigned Interviewer']]
+        return {
+            'first_name': row.values['First Name'],
+            'last_name': row.values['Last Name'],
+            'assigned_interviewer': row.values['Assigned Interviewer'],
+            'assigned_interviewer_email': interviewer['email'],
+            'assigned_interviewer_calendly': interviewer['calendly']
+        }
+
+def synthetic_sheet(rows: int):
+    # Every tenth row has already been sent so that the write-back has gaps to coalesce around
+    values = [HEADERS]
+    interviewers = list(INTERVIEWERS.keys())
+    for i in range(rows):
+        values.append([
+            f'First{i}',
+            f'Last{i}',
+            f'user{i}@example.com',
+            'Invite Sent' if i % 10 == 9 else 'Pending',
+            interviewers[i % len(interviewers)],
+            '',
+        ])
+    return values
+
+def run(rows: int, args: argparse.Namespace):
+    api = FakeGoogleApi(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        script_error_rate=args.script_error_rate,
+        quota=args.quota,
+        quota_window=args.quota_window,
+        seed=args.seed)
+    api.add_sheet(SPREADSHEET_ID, SHEET_NAME, synthetic_sheet(rows))
+
+    with api:
+        http = TimedHttp()
+        metrics = Metrics(enabled=args.metrics is not None)
+        wrapper = GoogleApiWrapper(
+            api_endpoint=api.endpoint,
+            http=http,
+            num_retries=args.num_retries,
+            metrics=metrics,
+            authenticate=False)
+        # The fake scripts.run accepts any deployment, .env does not need to be set up
+        wrapper.mailer_key = 'benchmark'
+        start = time.perf_counter()
+        # The pipeline prints a line per failed row, keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            email = BenchmarkEmail(SPREADSHEET_ID, SHEET_NAME, f'A1:F{rows + 1}', wrapper=wrapper)
+            email.send('sample_email.html', 'Benchmark')
+        elapsed = time.perf_counter() - start
+
+    if args.metrics is not None:
+        metrics.write_json(os.path.join(args.metrics, f'report-{rows}.json'))
+        metrics.write_prometheus(os.path.join(args.metrics, f'metrics-{rows}.prom'))
+
+    sent = len(api.sent_emails)
+    return {
+        'rows': rows,
+        'emails_sent': sent,
+        'elapsed_s': round(elapsed, 3),
+        'emails_per_s': round(sent / elapsed, 1) if elapsed else 0.0,
+        'api_calls': len(http.latencies),
+        'p50_ms': round(percentile(http.latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(http.latencies, 99) * 1000, 2),
+        'calls_by_method': dict(api.calls),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the email pipeline against a local fake of the Google APIs')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000, 20000], help='Sheet sizes to benchmark')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fixed latency per request in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random extra latency per request in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with a 500')
+    parser.add_argument('--script-error-rate', type=float, default=0.0, help='Fraction of scripts.run calls returning a script error')
+    parser.add_argument('--quota', type=int, default=None, help='Requests allowed per quota window before 429s')
+    parser.add_argument('--quota-window', type=float, default=60.0, help='Length of the quota window in seconds')
+    parser.add_argument('--num-retries', type=int, default=0, help='Retries on 429 and 5xx responses')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the simulated failures')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--metrics', default=None, help='Directory to write the run report and Prometheus metrics of each run to')
+    args = parser.parse_args()
+    if args.metrics is not None:
+        args.metrics = os.path.abspath(args.metrics)
+        os.makedirs(args.metrics, exist_ok=True)
+
+    # Templates are loaded relative to the working directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = [run(rows, args) for rows in args.rows]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    columns = ['rows', 'emails_sent', 'elapsed_s', 'emails_per_s', 'api_calls', 'p50_ms', 'p99_ms']
+    print(''.join(f'{c:>14}' for c in columns))
+    for result in results:
+        print(''.join(f'{result[c]:>14}' for c in columns))
+
+if __name__ == '__main__':
+    main()
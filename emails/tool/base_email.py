@@ -1,9 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List
 
 from jinja2 import Environment, FileSystemLoader
 
 from tool.google_api_wrapper import GoogleApiWrapper
+from tool.metrics import Metrics
 from tool.spreadsheet import Spreadsheet
 
 class EmailDetails:
@@ -14,12 +15,26 @@ class EmailDetails:
         self.body = body
 
 class BaseEmail(ABC):
-    def __init__(self, spreadsheet_id: str, sheet_name: str, sheet_range: str):
+    def __init__(
+            self,
+            spreadsheet_id: str,
+            sheet_name: str,
+            sheet_range: str,
+            wrapper: GoogleApiWrapper | None = None,
+            metrics: Metrics | None = None):
+        """
+        metrics is attached to the wrapper created here. When an existing wrapper is given, its metrics
+        are used instead and passing a different metrics raises a ValueError.
+        """
+        if wrapper is not None and metrics is not None and wrapper.metrics is not metrics:
+            raise ValueError('metrics must be passed to the GoogleApiWrapper when an existing wrapper is given')
         self.spreadsheet_id = spreadsheet_id
         self.sheet_name = sheet_name
         self.sheet_range = sheet_range
-        self.wrapper = GoogleApiWrapper()
-        self.sheet = self.wrapper.get_spreadsheet(self.spreadsheet_id, self.sheet_name, self.sheet_range)
+        self.wrapper = wrapper or GoogleApiWrapper(metrics=metrics)
+        self.metrics = self.wrapper.metrics
+        with self.metrics.phase('fetch'):
+            self.sheet = self.wrapper.get_spreadsheet(self.spreadsheet_id, self.sheet_name, self.sheet_range)
 
     @abstractmethod
     def render_content(self, row: Spreadsheet.Row):
@@ -37,34 +52,55 @@ class BaseEmail(ABC):
     def filter_fn(self, row: Spreadsheet.Row):
         pass
 
-    def prepare_update_data(self, header: str, rows: List[Spreadsheet.Row], updated_value: str):
-        status_column_letter = self.sheet.get_header_letter(header)
+    def prepare_update_data(
+            self,
+            header: str,
+            rows: List[Spreadsheet.Row],
+            updated_value: str,
+            other_values: Dict[str, str] | None = None):
+        """
+        Prepares the cell updates setting header to updated_value for the given rows. other_values
+        maps any other headers to their values (i.e. a timestamp) so that several columns are written
+        back in the same pass.
+        """
+        updated_values = {header: updated_value, **(other_values or {})}
         data = []
-        for i in range(len(rows)):
-            range_name = f'{self.sheet.sheet_name}!{status_column_letter}{rows[i].index}'
-            data.append((range_name, updated_value))
+        for (h, value) in updated_values.items():
+            status_column_letter = self.sheet.get_header_letter(h)
+            for i in range(len(rows)):
+                range_name = f'{self.sheet.sheet_name}!{status_column_letter}{rows[i].index}'
+                data.append((range_name, value))
         return data
 
     def send(self, email_template_name: str, subject: str, cc: List[str] = []):
-        filtered_rows = [row for row in self.sheet.rows if self.filter_fn(row)]
-
-        template_loader = FileSystemLoader(searchpath='templates/')
-        template_env = Environment(loader=template_loader)
-        template = template_env.get_template(email_template_name)
-
-        data = {}
-        for row in filtered_rows:
-            data[row] = {
-                'to': self.get_email(row),
-                'subject': subject,
-                'cc': ','.join(cc),
-                'body': template.render(self.render_content(row)).replace('\n', '<br/>'),
-            }
-        successful_rows = self.wrapper.send_emails(data)
-
-        self.on_send(successful_rows)
+        with self.metrics.phase('render'):
+            filtered_rows = [row for row in self.sheet.rows if self.filter_fn(row)]
+
+            template_loader = FileSystemLoader(searchpath='templates/')
+            template_env = Environment(loader=template_loader)
+            template = template_env.get_template(email_template_name)
+
+            data = {}
+            for row in filtered_rows:
+                data[row] = {
+                    'to': self.get_email(row),
+                    'subject': subject,
+                    'cc': ','.join(cc),
+                    'body': template.render(self.render_content(row)).replace('\n', '<br/>'),
+                }
+
+        with self.metrics.phase('send'):
+            successful_rows = self.wrapper.send_emails(data)
+        self.metrics.count('sent', len(successful_rows))
+        self.metrics.count('failed', len(data) - len(successful_rows))
+
+        with self.metrics.phase('write_back'):
+            self.on_send(successful_rows)
 
         print('All emails sent where possible')
         print(f'Successfully sent to {", ".join([str(r.index) for r in successful_rows])}')
+        if self.metrics.enabled:
+            phases = ', '.join(f'{name} {duration:.2f}s' for name, duration in self.metrics.phases.items())
+            print(f'Time taken: {phases}')
 
 
@@ -0,0 +1,285 @@
+"""
+Local stand-in for the subset of the Google APIs used by GoogleApiWrapper.
+
+Implements Sheets values.get, values.batchGet and values.batchUpdate as well as Apps Script
+scripts.run so that the email pipeline can be exercised and benchmarked without hitting the live
+APIs or sending real emails. Latency, error rates and a 429 quota can be configured to mimic the
+behaviour of the real services.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, unquote, urlparse
+
+from tool.utils import from_base26
+
+class FakeGoogleApi:
+    """
+    Holds the fake spreadsheets, the emails "sent" through scripts.run and the failure
+    configuration. Use as a context manager or call start() and stop() to run the server.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            script_error_rate: float = 0.0,
+            quota: int | None = None,
+            quota_window: float = 60.0,
+            seed: int | None = None,
+            host: str = '127.0.0.1',
+            port: int = 0):
+        """
+        latency and jitter (seconds) delay every response by latency + uniform(0, jitter).
+        error_rate is the fraction of requests that fail with a 500 and script_error_rate is the
+        fraction of scripts.run calls that return a script execution error (i.e. a bad address).
+        quota is the number of requests allowed in every quota_window seconds before the server
+        starts responding with 429.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.script_error_rate = script_error_rate
+        self.quota = quota
+        self.quota_window = quota_window
+        self.random = random.Random(seed)
+
+        self.spreadsheets: Dict[str, Dict[str, List[List[str]]]] = {}
+        self.sent_emails: List[list] = []
+        self.calls: Dict[str, int] = {}
+
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def add_sheet(self, spreadsheet_id: str, sheet_name: str, values: List[List[str]]):
+        self.spreadsheets.setdefault(spreadsheet_id, {})[sheet_name] = [list(row) for row in values]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def parse_range(self, range_name: str):
+        """
+        Parses Sheet!A1:F3 or Sheet!F12 into (sheet_name, start_row, start_col, end_row, end_col)
+        using zero-based inclusive indices.
+        """
+        sheet_name, _, cells = range_name.rpartition('!')
+        if len(sheet_name) >= 2 and sheet_name[0] == sheet_name[-1] == "'":
+            sheet_name = sheet_name[1:-1].replace("''", "'")
+        match = re.fullmatch(r'([A-Z]+)([0-9]+)(?::([A-Z]+)([0-9]+))?', cells)
+        if not match:
+            raise ValueError(f'Unable to parse range: {range_name}')
+        start_col, start_row, end_col, end_row = match.groups()
+        end_col = end_col or start_col
+        end_row = end_row or start_row
+        return (
+            sheet_name,
+            int(start_row) - 1,
+            from_base26(start_col) - 1,
+            int(end_row) - 1,
+            from_base26(end_col) - 1)
+
+    def get_sheet(self, spreadsheet_id: str, sheet_name: str):
+        try:
+            return self.spreadsheets[spreadsheet_id][sheet_name]
+        except KeyError:
+            raise LookupError(f'Unable to find sheet {sheet_name} in {spreadsheet_id}')
+
+    def read_range(self, spreadsheet_id: str, range_name: str):
+        sheet_name, start_row, start_col, end_row, end_col = self.parse_range(range_name)
+        grid = self.get_sheet(spreadsheet_id, sheet_name)
+        values = []
+        for row in grid[start_row:end_row + 1]:
+            values.append(row[start_col:end_col + 1])
+        # Like the real API, trailing empty rows are omitted
+        while values and not any(values[-1]):
+            values.pop()
+        result = {'range': range_name, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def write_range(self, spreadsheet_id: str, range_name: str, values: List[list]):
+        sheet_name, start_row, start_col, _, _ = self.parse_range(range_name)
+        grid = self.get_sheet(spreadsheet_id, sheet_name)
+        updated_cells = 0
+        with self.lock:
+            for r, row_values in enumerate(values):
+                row_index = start_row + r
+                while len(grid) <= row_index:
+                    grid.append([])
+                row = grid[row_index]
+                for c, value in enumerate(row_values):
+                    col_index = start_col + c
+                    while len(row) <= col_index:
+                        row.append('')
+                    row[col_index] = '' if value is None else str(value)
+                    updated_cells += 1
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'updatedRange': range_name,
+            'updatedRows': len(values),
+            'updatedCells': updated_cells,
+        }
+
+    def values_get(self, spreadsheet_id: str, range_name: str):
+        return self.read_range(spreadsheet_id, range_name)
+
+    def values_batch_get(self, spreadsheet_id: str, ranges: List[str]):
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'valueRanges': [self.read_range(spreadsheet_id, r) for r in ranges],
+        }
+
+    def values_batch_update(self, spreadsheet_id: str, body: dict):
+        responses = [self.write_range(spreadsheet_id, d['range'], d.get('values', [])) for d in body.get('data', [])]
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'totalUpdatedRows': sum(r['updatedRows'] for r in responses),
+            'totalUpdatedCells': sum(r['updatedCells'] for r in responses),
+            'totalUpdatedSheets': len({self.parse_range(r['updatedRange'])[0] for r in responses}),
+            'responses': responses,
+        }
+
+    def scripts_run(self, script_id: str, body: dict):
+        if self.should_fail(self.script_error_rate):
+            return {
+                'done': True,
+                'error': {
+                    'code': 3,
+                    'message': 'ScriptError',
+                    'details': [{
+                        '@type': 'type.googleapis.com/google.apps.script.v1.ExecutionError',
+                        'errorMessage': 'Exception: Invalid email',
+                        'errorType': 'ScriptError',
+                    }],
+                },
+            }
+        with self.lock:
+            self.sent_emails.append(body.get('parameters', []))
+        return {
+            'done': True,
+            'response': {
+                '@type': 'type.googleapis.com/google.apps.script.v1.ExecutionResponse',
+                'result': None,
+            },
+        }
+
+    def should_fail(self, rate: float):
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def over_quota(self):
+        if self.quota is None:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.quota_window:
+                self.window_start = now
+                self.window_requests = 0
+            self.window_requests += 1
+            return self.window_requests > self.quota
+
+    def route(self, method: str, path: str, query: dict, body: dict | None):
+        """
+        Finds the API method matching the request, returning its name and a callable producing the
+        response body or (None, None) if there is no such method.
+        """
+        if match := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values:batchGet', path):
+            if method == 'GET':
+                return 'values.batchGet', lambda: self.values_batch_get(match.group(1), query.get('ranges', []))
+        elif match := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values:batchUpdate', path):
+            if method == 'POST':
+                return 'values.batchUpdate', lambda: self.values_batch_update(match.group(1), body or {})
+        elif match := re.fullmatch(r'/v4/spreadsheets/([^/]+)/values/([^/]+)', path):
+            if method == 'GET':
+                return 'values.get', lambda: self.values_get(match.group(1), unquote(match.group(2)))
+        elif match := re.fullmatch(r'/v1/scripts/([^/]+):run', path):
+            if method == 'POST':
+                return 'scripts.run', lambda: self.scripts_run(match.group(1), body or {})
+        return None, None
+
+    def handle(self, method: str, raw_path: str, raw_body: bytes):
+        url = urlparse(raw_path)
+        name, action = self.route(method, url.path, parse_qs(url.query), json.loads(raw_body) if raw_body else None)
+        if name is None:
+            return 404, error_body(404, f'Unknown method {method} {url.path}', 'NOT_FOUND')
+
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.over_quota():
+            return 429, error_body(429, 'Quota exceeded', 'RESOURCE_EXHAUSTED')
+        if self.should_fail(self.error_rate):
+            return 500, error_body(500, 'Internal error encountered.', 'INTERNAL')
+        try:
+            return 200, action()
+        except (ValueError, LookupError) as err:
+            return 400, error_body(400, str(err), 'INVALID_ARGUMENT')
+
+    def make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Avoid delayed ACK stalls between the header and body writes on keep-alive connections
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self.respond(*api.handle('GET', self.path, b''))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.respond(*api.handle('POST', self.path, self.rfile.read(length)))
+
+            def respond(self, status: int, body: dict):
+                content = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                # Silence the default per-request logging to stderr
+                pass
+
+        return Handler
+
+def error_body(code: int, message: str, status: str):
+    return {'error': {'code': code, 'message': message, 'status': status}}
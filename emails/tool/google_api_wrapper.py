@@ -6,28 +6,55 @@ format before being passed off to Google App Script to be sent through emails.
 """
 
 import os.path
+import time
 from os import getenv
 from typing import List
 
+import httplib2
 from dotenv import load_dotenv
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient import errors
 from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest, build_http
 
+from tool.metrics import AttemptCountingHttp, Metrics
 from tool.spreadsheet import Spreadsheet
+from tool.utils import chunk_updates, coalesce_updates
 
 class GoogleApiWrapper:
     SCOPES = [
         'https://www.googleapis.com/auth/spreadsheets',
         'https://www.googleapis.com/auth/script.send_mail'
     ]
-
-    def __init__(self):
+    # Sheets API requests are capped at 2MB, keep well below that for each batchUpdate
+    MAX_UPDATE_PAYLOAD_BYTES = 1_000_000
+
+    def __init__(
+            self,
+            api_endpoint: str | None = None,
+            http: httplib2.Http | None = None,
+            num_retries: int = 0,
+            metrics: Metrics | None = None,
+            authenticate: bool = True):
+        """
+        api_endpoint overrides the root URL of the Google APIs (i.e. to point at a regional endpoint
+        or the local stand-in in tool.fake_google_api). http is the transport used for every request
+        and num_retries is the number of times a request is retried on 429 and 5xx responses.
+        authenticate=False sends requests without credentials, which is only useful against the
+        local stand-in.
+        metrics records the timing of every API call, it is disabled when not given.
+        """
         load_dotenv()
         self.mailer_key = getenv('MAILER_DEPLOYMENT_KEY')
-        self.creds = self.auth()
+        self.api_endpoint = api_endpoint
+        self.http = http
+        self.num_retries = num_retries
+        self.metrics = metrics or Metrics(enabled=False)
+        with self.metrics.phase('auth'):
+            self.creds = self.auth() if authenticate else None
 
     def auth(self):
         # Handle the authentication part with Google
@@ -46,15 +73,40 @@ class GoogleApiWrapper:
 
         return creds
 
+    def build_service(self, service_name: str, version: str):
+        http = self.http or build_http()
+        if self.creds is not None:
+            http = AuthorizedHttp(self.creds, http=http)
+        client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+        return build(service_name, version, http=http, client_options=client_options)
+
+    def execute(self, method: str, request: HttpRequest):
+        # Executes the API request, recording its latency, retries and failures under method
+        if not self.metrics.enabled:
+            return request.execute(num_retries=self.num_retries)
+
+        http = AttemptCountingHttp(request.http)
+        start = time.perf_counter()
+        try:
+            return request.execute(http=http, num_retries=self.num_retries)
+        except errors.HttpError as err:
+            self.metrics.record_failure(method, f'http_{err.resp.status}')
+            raise
+        except Exception as err:
+            self.metrics.record_failure(method, type(err).__name__)
+            raise
+        finally:
+            self.metrics.record_request(method, time.perf_counter() - start, max(0, http.attempts - 1))
+
     def get_spreadsheet(self, spreadsheet_id: str, sheet_name: str, sheet_range: str):
         # Retrieves and parses a Spreadsheet given the ID, name, and range
         try:
-            service = build('sheets', 'v4', credentials=self.creds)
+            service = self.build_service('sheets', 'v4')
 
             sheet = service.spreadsheets()
-            result = sheet.values().get(
+            result = self.execute('values.get', sheet.values().get(
                 spreadsheetId=spreadsheet_id,
-                range=f'{sheet_name}!{sheet_range}').execute()
+                range=f'{sheet_name}!{sheet_range}'))
             values = result.get('values', [])
 
             if not values:
@@ -66,41 +118,51 @@ class GoogleApiWrapper:
             print(err)
 
     def update_spreadsheet_values(self, spreadsheet_id: str, data: List[tuple]):
+        # Consecutive cells in the same column with the same value are written as a single range
+        # and the batch is split so that no single request grows past MAX_UPDATE_PAYLOAD_BYTES
+        updates = coalesce_updates(data, self.MAX_UPDATE_PAYLOAD_BYTES)
+        chunks = chunk_updates(updates, self.MAX_UPDATE_PAYLOAD_BYTES)
+
         try:
-            service = build('sheets', 'v4', credentials=self.creds)
-
-            rows_update = []
-            for (range_name, value) in data:
-                rows_update.append({
-                    'range': range_name,
-                    'values': [[value]]
-                })
-
-            body = {
-                'valueInputOption': 'USER_ENTERED',
-                'data': rows_update
-            }
-
-            (service
-                .spreadsheets()
-                .values()
-                .batchUpdate(spreadsheetId=spreadsheet_id, body=body)
-                .execute())
+            service = self.build_service('sheets', 'v4')
         except errors.HttpError as err:
             print(err)
+            return
+
+        for chunk in chunks:
+            try:
+                rows_update = []
+                for (range_name, values) in chunk:
+                    rows_update.append({
+                        'range': range_name,
+                        'values': values
+                    })
+
+                body = {
+                    'valueInputOption': 'USER_ENTERED',
+                    'data': rows_update
+                }
+
+                self.execute('values.batchUpdate', service
+                    .spreadsheets()
+                    .values()
+                    .batchUpdate(spreadsheetId=spreadsheet_id, body=body))
+            except errors.HttpError as err:
+                print(err)
 
     def send_emails(self, data: dict):
         successful_rows = []
 
         for row, values in data.items():
             try:
-                service = build('script', 'v1', credentials=self.creds)
+                service = self.build_service('script', 'v1')
                 request = {
                     'function': 'sendMail',
                     'parameters': [values['to'], values['subject'], values['body'], values['cc']]
                 }
-                response = service.scripts().run(scriptId=self.mailer_key, body=request).execute()
+                response = self.execute('scripts.run', service.scripts().run(scriptId=self.mailer_key, body=request))
                 if 'error' in response:
+                    self.metrics.record_failure('scripts.run', 'script_error')
                     print(f"Row {row.index} failed because {response['error']['details'][0]['errorMessage']}")
                 else:
                     # Successful
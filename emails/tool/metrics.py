@@ -0,0 +1,170 @@
+"""
+Instrumentation for the email pipeline.
+
+Records the wall time of each phase of a run (auth, fetch, render, send, write back), the latency,
+retries and failures of every Google API call, and simple counters such as the number of emails
+sent. The results can be exported as a JSON run report or in the Prometheus text format.
+
+A disabled Metrics instance records nothing and its phase() is a shared no-op context manager so
+instrumented code pays close to nothing when metrics are turned off.
+"""
+
+import json
+import math
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+class Metrics:
+    # Upper bounds in seconds of the request latency histogram buckets
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    NAMESPACE = 'email'
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self.retries: Dict[str, int] = {}
+        self.failures: Dict[Tuple[str, str], int] = {}
+        self.counters: Dict[str, int] = {}
+
+    def phase(self, name: str):
+        """
+        Context manager that adds the wall time of the block to the given phase.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self.time_phase(name)
+
+    @contextmanager
+    def time_phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def record_request(self, method: str, latency: float, retries: int = 0):
+        if not self.enabled:
+            return
+        self.latencies.setdefault(method, []).append(latency)
+        self.retries[method] = self.retries.get(method, 0) + retries
+
+    def record_failure(self, method: str, reason: str):
+        if not self.enabled:
+            return
+        self.failures[(method, reason)] = self.failures.get((method, reason), 0) + 1
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_report(self):
+        """
+        Summarizes the run as a dictionary that can be serialized to JSON.
+        """
+        requests = {}
+        for method, latencies in self.latencies.items():
+            requests[method] = {
+                'count': len(latencies),
+                'retries': self.retries.get(method, 0),
+                'total_s': round(sum(latencies), 6),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                'max_ms': round(max(latencies) * 1000, 3),
+            }
+
+        failures = {}
+        for (method, reason), count in self.failures.items():
+            failures.setdefault(method, {})[reason] = count
+
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_s': round(time.perf_counter() - self.start, 6),
+            'phases_s': {name: round(duration, 6) for name, duration in self.phases.items()},
+            'requests': requests,
+            'failures': failures,
+            'counters': dict(self.counters),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_report(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Renders the metrics in the Prometheus text exposition format.
+        """
+        ns = self.NAMESPACE
+        lines = []
+
+        lines.append(f'# HELP {ns}_phase_seconds Wall time spent in each phase of the email run.')
+        lines.append(f'# TYPE {ns}_phase_seconds gauge')
+        for name, duration in self.phases.items():
+            lines.append(f'{ns}_phase_seconds{labels(phase=name)} {duration}')
+
+        lines.append(f'# HELP {ns}_api_request_duration_seconds Latency of Google API calls including retries.')
+        lines.append(f'# TYPE {ns}_api_request_duration_seconds histogram')
+        for method, latencies in self.latencies.items():
+            for bound in self.BUCKETS:
+                count = sum(1 for latency in latencies if latency <= bound)
+                lines.append(f'{ns}_api_request_duration_seconds_bucket{labels(method=method, le=str(bound))} {count}')
+            lines.append(f'{ns}_api_request_duration_seconds_bucket{labels(method=method, le="+Inf")} {len(latencies)}')
+            lines.append(f'{ns}_api_request_duration_seconds_sum{labels(method=method)} {sum(latencies)}')
+            lines.append(f'{ns}_api_request_duration_seconds_count{labels(method=method)} {len(latencies)}')
+
+        lines.append(f'# HELP {ns}_api_retries_total Retried attempts of Google API calls.')
+        lines.append(f'# TYPE {ns}_api_retries_total counter')
+        for method, retries in self.retries.items():
+            lines.append(f'{ns}_api_retries_total{labels(method=method)} {retries}')
+
+        lines.append(f'# HELP {ns}_api_failures_total Failed Google API calls by reason.')
+        lines.append(f'# TYPE {ns}_api_failures_total counter')
+        for (method, reason), count in self.failures.items():
+            lines.append(f'{ns}_api_failures_total{labels(method=method, reason=reason)} {count}')
+
+        for name, value in self.counters.items():
+            lines.append(f'# TYPE {ns}_{name}_total counter')
+            lines.append(f'{ns}_{name}_total {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+    def write_prometheus(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus())
+
+class AttemptCountingHttp:
+    """
+    Wraps an HTTP transport and counts the attempts made through it so that the retries performed
+    by googleapiclient can be recorded.
+    """
+
+    def __init__(self, http):
+        self.http = http
+        self.attempts = 0
+
+    def request(self, *args, **kwargs):
+        self.attempts += 1
+        return self.http.request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+def labels(**values: str):
+    def escape(value: str):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in values.items()) + '}'
+
+def percentile(values: List[float], p: float):
+    # Nearest-rank percentile
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
@@ -1,3 +1,7 @@
+import json
+import re
+from typing import List
+
 def from_base26(s: str):
     res = 0
     pow = 1
@@ -11,4 +15,101 @@ def to_base26(n: int):
     while n > 0:
         res += chr(ord('A') + (n % 26 - 1))
         n //= 26
-    return res[::-1]
\ No newline at end of file
+    return res[::-1]
+
+def parse_cell(range_name: str):
+    """
+    Splits a single cell A1 reference like Sheet1!F12 into (sheet_name, column, row). Returns None
+    if the reference is not a single cell.
+    """
+    sheet_name, _, cell = range_name.rpartition('!')
+    match = re.fullmatch(r'([A-Z]+)([0-9]+)', cell)
+    if not match:
+        return None
+    return sheet_name, match.group(1), int(match.group(2))
+
+def coalesce_updates(data: List[tuple], max_bytes: int | None = None):
+    """
+    Merges single cell updates on consecutive rows of the same column that share the same value into
+    a single range update, i.e. Sheet1!F12, Sheet1!F13 with the same value becomes Sheet1!F12:F13.
+    When max_bytes is given, merged ranges are split into smaller row ranges so that no single update
+    serializes to more than max_bytes.
+
+    Returns a list of (range_name, values) where values is the 2D list expected by the Sheets API.
+    Ranges that are not single cells are passed through as is, in their original order relative to
+    the other updates so that later writes still take precedence.
+    """
+    cells = {}
+    updates = []
+    for (range_name, value) in data:
+        cell = parse_cell(range_name)
+        if cell is None:
+            # Flush the pending cells first as the range may overlap with them
+            updates.extend(merge_cells(cells, max_bytes))
+            cells = {}
+            updates.append((range_name, [[value]]))
+            continue
+        sheet_name, column, row = cell
+        # Later updates to the same cell take precedence
+        cells.setdefault((sheet_name, column), {})[row] = value
+    updates.extend(merge_cells(cells, max_bytes))
+
+    return updates
+
+def merge_cells(cells: dict, max_bytes: int | None):
+    updates = []
+    for (sheet_name, column), column_cells in cells.items():
+        rows = sorted(column_cells.keys())
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i < len(rows) and rows[i] == rows[i - 1] + 1 and column_cells[rows[i]] == column_cells[rows[start]]:
+                continue
+            updates.extend(split_run(sheet_name, column, rows[start], rows[i - 1], column_cells[rows[start]], max_bytes))
+            start = i
+    return updates
+
+def split_run(sheet_name: str, column: str, start_row: int, end_row: int, value, max_bytes: int | None):
+    """
+    Splits the rows start_row to end_row of a column set to value into range updates that each
+    serialize to at most max_bytes (including the separator used by chunk_updates).
+    """
+    count = end_row - start_row + 1
+    rows_per_update = count
+    if max_bytes is not None:
+        # Every row adds [value] and a separator, the rest is the size of an empty update
+        row_size = len(json.dumps([value])) + 2
+        overhead = len(json.dumps({'range': f'{sheet_name}!{column}{end_row}:{column}{end_row}', 'values': []})) + 2
+        rows_per_update = max(1, (max_bytes - overhead) // row_size)
+
+    updates = []
+    for first in range(start_row, end_row + 1, rows_per_update):
+        last = min(first + rows_per_update - 1, end_row)
+        range_name = f'{sheet_name}!{column}{first}'
+        if last != first:
+            range_name += f':{column}{last}'
+        updates.append((range_name, [[value]] * (last - first + 1)))
+    return updates
+
+def chunk_updates(updates: List[tuple], max_bytes: int):
+    """
+    Splits range updates into chunks where the serialized size of each chunk is at most max_bytes.
+    Raises a ValueError if a single update is larger than max_bytes, use coalesce_updates with
+    max_bytes to split merged ranges beforehand.
+    """
+    chunks = []
+    current = []
+    current_size = 0
+    for (range_name, values) in updates:
+        # Account for the separator between the updates in the serialized request
+        size = len(json.dumps({'range': range_name, 'values': values})) + 2
+        if size > max_bytes:
+            raise ValueError(f'Update to {range_name} is {size} bytes which is over the {max_bytes} bytes limit')
+        if current and current_size + size > max_bytes:
+            chunks.append(current)
+            current = []
+            current_size = 0
+        current.append((range_name, values))
+        current_size += size
+    if current:
+        chunks.append(current)
+    return chunks